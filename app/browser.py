@@ -1,10 +1,46 @@
-from playwright.sync_api import sync_playwright
-
-def fetch_rendered_html_sync(url: str) -> str:
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
-        page.goto(url, wait_until="networkidle")
-        html = page.content()
-        browser.close()
-        return html
+from playwright.async_api import async_playwright
+
+
+class BrowserSession:
+    """
+    Headless browser reused for every rendered fetch in a quiz chain.
+    Chromium is only launched on the first fetch.
+    """
+
+    def __init__(self):
+        self._playwright = None
+        self._browser = None
+        self._page = None
+
+    async def fetch_rendered_html(self, url: str) -> str:
+        if self._page is None:
+            await self._launch()
+
+        await self._page.goto(url, wait_until="networkidle")
+        return await self._page.content()
+
+    async def _launch(self):
+        # Build into locals so a failed launch leaves no half-started
+        # driver behind for the next call to overwrite
+        playwright = await async_playwright().start()
+        try:
+            browser = await playwright.chromium.launch(headless=True)
+            try:
+                page = await browser.new_page()
+            except BaseException:
+                await browser.close()
+                raise
+        except BaseException:
+            await playwright.stop()
+            raise
+        self._playwright, self._browser, self._page = playwright, browser, page
+
+    async def close(self):
+        playwright, browser = self._playwright, self._browser
+        self._playwright = self._browser = self._page = None
+        try:
+            if browser is not None:
+                await browser.close()
+        finally:
+            if playwright is not None:
+                await playwright.stop()
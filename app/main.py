@@ -1,16 +1,31 @@
 # app/main.py
 
-from fastapi import FastAPI, Request, HTTPException
-from pydantic import BaseModel
+from contextlib import asynccontextmanager
+
+from fastapi import BackgroundTasks, Depends, FastAPI, Request, HTTPException
+from pydantic import BaseModel, ValidationError
 from dotenv import load_dotenv
+import hmac
+import logging
 import os
 
-from .solver import solve_quiz_chain
+from .solver import solve_quiz_chain, close_client
 
 # Load environment variables from .env in project root
 load_dotenv()
 
-app = FastAPI()
+# Solver progress goes through logging; set LOG_LEVEL=DEBUG for step details
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Release pooled HTTP connections on shutdown
+    await close_client()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Read config from environment
 EXPECTED_SECRET = os.getenv("LLM_QUIZ_SECRET")
@@ -23,29 +38,36 @@ class QuizRequest(BaseModel):
     url: str
 
 
-@app.post("/quiz")
-async def handle_quiz(request: Request):
-    # 1) Parse JSON body
+async def parse_quiz_request(request: Request) -> QuizRequest:
+    """
+    Parse and validate the body in one pydantic-core pass. The body is
+    read as JSON whatever its Content-Type; bad bodies are a 400 per spec.
+    """
     try:
-        data = await request.json()
-    except Exception:
-        raise HTTPException(status_code=400, detail="Invalid JSON")
-
-    # 2) Validate required fields using Pydantic
-    try:
-        qr = QuizRequest(**data)
-    except Exception:
+        return QuizRequest.model_validate_json(await request.body())
+    except ValidationError as exc:
+        if any(err["type"] == "json_invalid" for err in exc.errors()):
+            raise HTTPException(status_code=400, detail="Invalid JSON")
         raise HTTPException(status_code=400, detail="Missing/invalid fields")
 
-    # 3) Check secret
-    if qr.secret != EXPECTED_SECRET:
+
+@app.post("/quiz")
+async def handle_quiz(
+    bg: BackgroundTasks, qr: QuizRequest = Depends(parse_quiz_request)
+):
+    # 1) JSON body is parsed and validated into QuizRequest
+
+    # 2) Check secret (constant-time; reject everything if none is configured)
+    if not EXPECTED_SECRET or not hmac.compare_digest(
+        qr.secret.encode(), EXPECTED_SECRET.encode()
+    ):
         raise HTTPException(status_code=403, detail="Invalid secret")
 
-    # 4) Call the quiz solver (async)
-    await solve_quiz_chain(qr.url, qr.email, qr.secret)
+    # 3) Run the quiz solver after the response is sent
+    bg.add_task(solve_quiz_chain, qr.url, qr.email, qr.secret)
 
-    # 5) Return a simple JSON confirming we started/ran it
+    # 4) Return a simple JSON confirming we started it
     return {
         "status": "ok",
-        "message": "Quiz processing attempted (see server logs for details)",
+        "message": "Quiz processing started (see server logs for details)",
     }
@@ -1,18 +1,113 @@
 # app/solver.py
 
+import functools
 import time
 from urllib.parse import urlparse, urlunparse, urljoin
-import io
+import logging
 import re
 
 import httpx
-import pandas as pd
-from fastapi.concurrency import run_in_threadpool
-from bs4 import BeautifulSoup
+import orjson
+from selectolax.lexbor import LexborHTMLParser
 
-from .browser import fetch_rendered_html_sync
+from .browser import BrowserSession
+
+log = logging.getLogger(__name__)
 
 MAX_DURATION_SEC = 180  # 3 minutes per spec
+CSV_CHUNK_SIZE = 1 << 20  # bytes per streamed CSV chunk
+
+_DIGIT_RE = re.compile(r"\d+")
+
+# Quiz type markers, matched case-insensitively without lowercasing the page
+# ("demo-scrape-data" is covered by "scrape")
+_QUIZ_MARKER_RE = re.compile(r"(scrape)|\.csv|audio", re.IGNORECASE)
+_SCRAPE_RE = re.compile(r"scrape", re.IGNORECASE)
+
+# `origin` as a class token (quoted, unquoted or among several classes);
+# a bare "origin" also hits crossorigin and window.location.origin
+_ORIGIN_CLASS_RE = re.compile(r"""class\s*=\s*["']?[^"'>]*\borigin\b""", re.IGNORECASE)
+
+# Shared HTTP client: keeps connections (and HTTP/2 sessions) alive
+# across quiz hops and across /quiz requests
+_client = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared AsyncClient, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=True,
+            timeout=30,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        )
+    return _client
+
+
+async def close_client():
+    """Close the shared AsyncClient (called on app shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+# ------------------------------
+# Fetch Helpers
+# ------------------------------
+
+async def fetch_html_fast(url: str, client, browser: BrowserSession):
+    """
+    Fetch a quiz page with a plain GET; fall back to the headless
+    browser if the GET fails or the quiz content needs JS to render.
+
+    Returns (html, tree, quiz_type) so the page is parsed and classified
+    once per hop. `tree` is None for generic pages, which no solver parses.
+    """
+    try:
+        resp = await client.get(url)
+        resp.raise_for_status()
+    except httpx.HTTPError:
+        resp = None
+
+    if resp is not None:
+        html = resp.text
+        quiz_type = detect_quiz_type(html)
+        # Generic pages always render, so don't parse their static HTML
+        if quiz_type != "generic":
+            tree = LexborHTMLParser(html)
+            if _is_static_quiz_page(tree, quiz_type):
+                return html, tree, quiz_type
+
+    html = await browser.fetch_rendered_html(url)
+    quiz_type = detect_quiz_type(html)
+    tree = LexborHTMLParser(html) if quiz_type != "generic" else None
+    return html, tree, quiz_type
+
+
+def _is_static_quiz_page(tree: LexborHTMLParser, quiz_type: str) -> bool:
+    """
+    True if the static page already holds everything the solver for
+    `quiz_type` reads, so it can be used without rendering.
+    """
+    # An empty `.origin` is filled in by JS
+    origin_el = tree.css_first(".origin")
+    if origin_el is not None and not origin_el.text(strip=True):
+        return False
+
+    if quiz_type == "scrape":
+        link = tree.css_first("#question a")
+        return link is not None and bool(link.attributes.get("href"))
+    if quiz_type == "audio":
+        # A missing cutoff would silently become 0, so it must be in the HTML
+        cutoff_el = tree.css_first("#cutoff")
+        return (
+            tree.css_first('a[href$=".csv"]') is not None
+            and cutoff_el is not None
+            and bool(cutoff_el.text(strip=True))
+        )
+    return False
 
 
 # ------------------------------
@@ -21,27 +116,40 @@ MAX_DURATION_SEC = 180  # 3 minutes per spec
 
 def detect_quiz_type(html: str) -> str:
     """Return quiz type label based on page content."""
-    html_l = html.lower()
-    if "demo-scrape-data" in html_l or "scrape" in html_l:
+    # One sweep finds the first marker; scrape outranks audio, so an audio
+    # hit only needs the rest of the page checked for a later scrape marker
+    m = _QUIZ_MARKER_RE.search(html)
+    if m is None:
+        return "generic"
+    if m.group(1) or _SCRAPE_RE.search(html, m.end()):
         return "scrape"
-    if ".csv" in html_l or "audio" in html_l:
-        return "audio"
-    return "generic"
+    return "audio"
+
 
+@functools.lru_cache(maxsize=32)
+def _origin(url: str) -> str:
+    """Return the scheme://host origin of `url` (cached per URL)."""
+    parsed = urlparse(url)
+    return urlunparse((parsed.scheme, parsed.netloc, "", "", "", "")).rstrip("/")
 
-def build_submit_url(html: str, current_url: str) -> str:
+
+def build_submit_url(html: str, current_url: str, tree=None) -> str:
     """
     Determine submit URL by attempting to read `.origin` span,
-    otherwise revert to current URL origin.
+    otherwise revert to current URL origin. `tree` is reused if the
+    page was already parsed.
     """
-    soup = BeautifulSoup(html, "html.parser")
-    origin_el = soup.select_one(".origin")
-
-    if origin_el and origin_el.text.strip():
-        origin = origin_el.text.strip()
+    # Skip parsing entirely when no `.origin` element can be present
+    origin_el = None
+    if _ORIGIN_CLASS_RE.search(html):
+        if tree is None:
+            tree = LexborHTMLParser(html)
+        origin_el = tree.css_first(".origin")
+
+    if origin_el and origin_el.text(strip=True):
+        origin = origin_el.text(strip=True)
     else:
-        parsed = urlparse(current_url)
-        origin = urlunparse((parsed.scheme, parsed.netloc, "", "", "", ""))
+        origin = _origin(current_url)
 
     return origin.rstrip("/") + "/submit"
 
@@ -50,40 +158,64 @@ def build_submit_url(html: str, current_url: str) -> str:
 # Solver Modules
 # ------------------------------
 
-async def solve_scrape_question(html: str, current_url: str, client) -> str:
+async def solve_scrape_question(
+    tree: LexborHTMLParser, current_url: str, client, browser: BrowserSession
+) -> str:
     """
     Solve scrape-based quiz:
     - follow /demo-scrape-data?email=...
     - extract the numeric secret code
     - return just the number as a string
     """
-    print("   [scrape] Solving scrape-based question...")
-    soup = BeautifulSoup(html, "html.parser")
-    link = soup.select_one("#question a")
+    log.debug("[scrape] Solving scrape-based question...")
+    link = tree.css_first("#question a")
+    href = link.attributes.get("href") if link else None
 
-    if not link or not link.get("href"):
+    if not href:
         raise ValueError("Scrape target link not found")
 
-    scrape_url = urljoin(current_url, link["href"])
-    print(f"   [scrape] Data page URL: {scrape_url}")
+    scrape_url = urljoin(current_url, href)
+    log.debug("[scrape] Data page URL: %s", scrape_url)
 
-    data_html = await run_in_threadpool(fetch_rendered_html_sync, scrape_url)
-    data_text = BeautifulSoup(data_html, "html.parser").get_text()
+    data_html = await browser.fetch_rendered_html(scrape_url)
+    data_text = LexborHTMLParser(data_html).body.text()
 
-    # Extract the first integer found in any non-empty line
-    for line in data_text.splitlines():
-        if not line.strip():
-            continue
-        m = re.search(r"\d+", line)
-        if m:
-            secret_code = m.group(0)  # e.g. "32000"
-            print(f"   [scrape] Extracted secret code: {secret_code}")
-            return secret_code
+    # Extract the first integer in the text (blank lines hold no digits,
+    # so this matches the first integer on any non-empty line)
+    m = _DIGIT_RE.search(data_text)
+    if m:
+        secret_code = m.group(0)  # e.g. "32000"
+        log.debug("[scrape] Extracted secret code: %s", secret_code)
+        return secret_code
 
     raise ValueError("Unable to extract secret code")
 
 
-async def solve_audio_csv_question(html: str, current_url: str, client) -> int:
+def _load_first_column(block: bytes):
+    """Parse column 0 of complete CSV lines (no header) as a float64 array."""
+    # Imported here so only the CSV path pays numpy's import cost
+    import io
+
+    import numpy as np
+
+    # Drop blank / whitespace-only lines, which loadtxt rejects
+    block = b"\n".join(line for line in block.splitlines() if line.strip())
+    if not block:
+        return np.empty(0, dtype=np.float64)
+    return np.loadtxt(
+        io.BytesIO(block),
+        delimiter=",",
+        usecols=0,
+        dtype=np.float64,
+        ndmin=1,
+        encoding="utf-8-sig",
+        quotechar='"',
+    )
+
+
+async def solve_audio_csv_question(
+    tree: LexborHTMLParser, current_url: str, client
+) -> int:
     """
     Solve audio/CSV quiz:
     - find CSV link
@@ -91,38 +223,44 @@ async def solve_audio_csv_question(html: str, current_url: str, client) -> int:
     - read cutoff from page
     - compute sum of values >= cutoff in the single data column
     """
-    print("   [audio] Solving audio/CSV question (automatic with cutoff >=)...")
-    soup = BeautifulSoup(html, "html.parser")
+    log.debug("[audio] Solving audio/CSV question (automatic with cutoff >=)...")
 
     # Find <a href="...csv"> by href
-    csv_tag = soup.find("a", href=lambda h: h and h.endswith(".csv"))
+    csv_tag = tree.css_first('a[href$=".csv"]')
     if not csv_tag:
         raise ValueError("CSV link not found")
 
-    csv_url = urljoin(current_url, csv_tag["href"])
-    print(f"   [audio] CSV URL: {csv_url}")
-
-    # Download CSV
-    resp = await client.get(csv_url)
-    resp.raise_for_status()
-
-    # IMPORTANT: no header row in file → header=None
-    df = pd.read_csv(io.BytesIO(resp.content), header=None)
-    print(f"   [audio] Data shape: {df.shape}")
-
-    # Cutoff from page
-    cutoff_el = soup.select_one("#cutoff")
-    cutoff = int(cutoff_el.text.strip()) if cutoff_el else 0
-    print(f"   [audio] Cutoff from page: {cutoff}")
-
-    # Use the first (and only) column as numeric series
-    series = pd.to_numeric(df.iloc[:, 0], errors="coerce")
-
-    # Rule: sum of values >= cutoff
-    mask = series >= cutoff
-    result = series[mask].sum()
-
-    print(f"   [audio] Sum of values >= {cutoff}: {result}")
+    csv_url = urljoin(current_url, csv_tag.attributes["href"])
+    log.debug("[audio] CSV URL: %s", csv_url)
+
+    # Cutoff from page (needed before streaming so rows can be summed as they arrive)
+    cutoff_el = tree.css_first("#cutoff")
+    cutoff = int(cutoff_el.text(strip=True)) if cutoff_el else 0
+    log.debug("[audio] Cutoff from page: %s", cutoff)
+
+    # Stream the CSV and keep a running sum, carrying any partial
+    # trailing line over to the next chunk
+    result = 0.0
+    rows = 0
+    leftover = b""
+    async with client.stream("GET", csv_url) as resp:
+        resp.raise_for_status()
+        async for chunk in resp.aiter_bytes(CSV_CHUNK_SIZE):
+            data = leftover + chunk
+            split_at = data.rfind(b"\n") + 1
+            leftover = data[split_at:]
+
+            # Rule: sum of values >= cutoff
+            values = _load_first_column(data[:split_at])
+            rows += values.size
+            result += values[values >= cutoff].sum()
+
+    values = _load_first_column(leftover)
+    rows += values.size
+    result += values[values >= cutoff].sum()
+    log.debug("[audio] Rows read: %s", rows)
+
+    log.debug("[audio] Sum of values >= %s: %s", cutoff, result)
     return int(result)
 
 
@@ -144,25 +282,29 @@ async def solve_quiz_chain(start_url: str, email: str, secret: str):
     start_time = time.time()
     current_url = start_url
 
-    async with httpx.AsyncClient(timeout=30) as client:
+    client = get_client()
+    # One browser for the whole chain, launched on first render
+    browser = BrowserSession()
 
+    try:
         while current_url and time.time() - start_time < MAX_DURATION_SEC:
-            print(f"\n🔎 Fetching quiz page: {current_url}")
+            log.info("🔎 Fetching quiz page: %s", current_url)
 
-            # Fetch question page HTML
-            html = await run_in_threadpool(fetch_rendered_html_sync, current_url)
+            # Fetch, parse and classify the question page
+            # (static GET first, browser if needed)
+            html, tree, quiz_type = await fetch_html_fast(current_url, client, browser)
 
             # Short snippet for debugging
-            snippet = html[:600].replace("\n", " ")
-            print(f"   [html] Snippet: {snippet[:200]}{'...' if len(snippet) > 200 else ''}")
+            if log.isEnabledFor(logging.DEBUG):
+                snippet = html[:201].replace("\n", " ")
+                log.debug("[html] Snippet: %s%s", snippet[:200], "..." if len(snippet) > 200 else "")
 
             # Build submit target
-            submit_url = build_submit_url(html, current_url)
-            print(f"   [meta] Submit URL: {submit_url}")
+            submit_url = build_submit_url(html, current_url, tree)
+            log.debug("[meta] Submit URL: %s", submit_url)
 
             # Determine solver
-            quiz_type = detect_quiz_type(html)
-            print(f"   [meta] Detected quiz type: {quiz_type}")
+            log.debug("[meta] Detected quiz type: %s", quiz_type)
 
             # Helper for payload
             def make_payload(answer_value):
@@ -175,43 +317,50 @@ async def solve_quiz_chain(start_url: str, email: str, secret: str):
 
             # SCRAPE TYPE
             if quiz_type == "scrape":
-                answer = await solve_scrape_question(html, current_url, client)
-                print(f"   [answer] Final answer (scrape): {answer}")
+                answer = await solve_scrape_question(tree, current_url, client, browser)
+                log.info("[answer] Final answer (scrape): %s", answer)
 
             # AUDIO/CSV TYPE
             elif quiz_type == "audio":
-                answer = await solve_audio_csv_question(html, current_url, client)
-                print(f"   [answer] Final answer (audio): {answer}")
+                answer = await solve_audio_csv_question(tree, current_url, client)
+                log.info("[answer] Final answer (audio): %s", answer)
 
             # GENERIC TYPE
             else:
                 answer = "hello-from-agent"
-                print("   [generic] Using default answer")
-                print(f"   [answer] Final answer (generic): {answer}")
+                log.debug("[generic] Using default answer")
+                log.info("[answer] Final answer (generic): %s", answer)
 
             # Submit response
             payload = make_payload(answer)
-            print(f"   [submit] Payload: {payload}")
-            response = await client.post(submit_url, json=payload)
-            print(f"   [submit] Raw response: {response.text}")
+            log.debug("[submit] Payload: %s", payload)
+            response = await client.post(
+                submit_url,
+                content=orjson.dumps(payload),
+                headers={"Content-Type": "application/json"},
+            )
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("[submit] Raw response: %s", response.text)
 
             # Parse server reply
             try:
-                result = response.json()
+                result = orjson.loads(response.content)
             except Exception as exc:
-                print("   [error] Invalid JSON from submit")
+                log.error("[error] Invalid JSON from submit")
                 raise RuntimeError(f"Invalid JSON from submit: {response.text}") from exc
 
-            print(f"   [result] Parsed response JSON: {result}")
+            log.info("[result] Parsed response JSON: %s", result)
 
             # Decide next URL
             next_url = result.get("url")
             if not next_url:
-                print("🏁 No more URLs returned. Quiz chain finished.")
+                log.info("🏁 No more URLs returned. Quiz chain finished.")
                 return result
 
-            print(f"➡️ Moving to next URL: {next_url}")
+            log.info("➡️ Moving to next URL: %s", next_url)
             current_url = next_url
 
-        print("⏰ Time limit reached or URL missing. Ending quiz chain.")
+        log.warning("⏰ Time limit reached or URL missing. Ending quiz chain.")
         return {"correct": False, "reason": "timeout or missing url"}
+    finally:
+        await browser.close()